@@ -11,17 +11,32 @@ import hashlib
 import json
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from urllib.request import urlopen, Request
-from urllib.error import URLError
+from itertools import islice, zip_longest
 
 import boto3
 import logging
+import urllib3
+from botocore.config import Config
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-S3_CLIENT = boto3.client("s3")
+# Clients live at module scope so warm invocations reuse pooled TCP/TLS
+# connections instead of re-handshaking per request.
+S3_CLIENT = boto3.client("s3", config=Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": 3}
+))
+HTTP = urllib3.PoolManager(
+    num_pools=1,
+    maxsize=16,
+    retries=urllib3.Retry(3, backoff_factor=0.5),
+    timeout=urllib3.Timeout(total=10),
+    headers={"User-Agent": "aws-datalake-platform/1.0"}
+)
 DATALAKE_BUCKET = os.environ["DATALAKE_BUCKET"]
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 CITIES = json.loads(os.environ["CITIES"])
@@ -38,16 +53,20 @@ OPEN_METEO_URL = (
 def fetch_weather(city: dict) -> dict | None:
     """Fetch weather data for a single city from Open-Meteo."""
     url = OPEN_METEO_URL.format(lat=city["latitude"], lon=city["longitude"])
-    req = Request(url, headers={"User-Agent": "aws-datalake-platform/1.0"})
     try:
-        with urlopen(req, timeout=10) as response:
-            return json.loads(response.read().decode("utf-8"))
-    except URLError as e:
+        response = HTTP.request("GET", url)
+    except urllib3.exceptions.HTTPError as e:
         logger.error("Failed to fetch weather for %s: %s", city["name"], e)
         return None
+    if response.status != 200:
+        logger.error("Failed to fetch weather for %s: HTTP %d", city["name"], response.status)
+        return None
+    return json.loads(response.data)
 
 
-def transform_response(city: dict, weather_data: dict, ingestion_id: str) -> list[dict]:
+def transform_response(
+    city: dict, weather_data: dict, ingestion_id: str, ingested_at: str
+) -> list[dict]:
     """Flatten the Open-Meteo hourly response into one record per hour."""
     hourly = weather_data.get("hourly", {})
     times = hourly.get("time", [])
@@ -56,38 +75,44 @@ def transform_response(city: dict, weather_data: dict, ingestion_id: str) -> lis
     wind = hourly.get("wind_speed_10m", [])
     precip = hourly.get("precipitation", [])
 
+    # Fields shared by every hour of this city's response
+    base = {
+        "ingestion_id": ingestion_id,
+        "city": city["name"],
+        "latitude": city["latitude"],
+        "longitude": city["longitude"],
+    }
+
+    # One record per entry in `times`; shorter value arrays are padded with None
+    rows = islice(zip_longest(times, temps, humidity, wind, precip), len(times))
     records = []
-    for i, t in enumerate(times):
+    for t, temp, hum, ws, pr in rows:
         records.append({
-            "ingestion_id": ingestion_id,
-            "city": city["name"],
-            "latitude": city["latitude"],
-            "longitude": city["longitude"],
+            **base,
             "timestamp": t,
-            "temperature_c": temps[i] if i < len(temps) else None,
-            "humidity_pct": humidity[i] if i < len(humidity) else None,
-            "windspeed_kmh": wind[i] if i < len(wind) else None,
-            "precipitation_mm": precip[i] if i < len(precip) else None,
-            "ingested_at": datetime.now(timezone.utc).isoformat()
+            "temperature_c": temp,
+            "humidity_pct": hum,
+            "windspeed_kmh": ws,
+            "precipitation_mm": pr,
+            "ingested_at": ingested_at
         })
     return records
 
 
-def write_to_s3(records: list[dict], city_name: str, date_str: str):
-    """Write records as newline-delimited JSON to S3."""
+def write_to_s3(records: list[dict], date_str: str, ingestion_id: str):
+    """Write all records of one ingestion run as a single newline-delimited JSON object."""
     if not records:
-        logger.warning("No records for %s, skipping write", city_name)
+        logger.warning("No records for ingestion %s, skipping write", ingestion_id)
         return
 
-    safe_city = city_name.replace(" ", "_").lower()
-    key = f"raw/weather/date={date_str}/{safe_city}_{uuid.uuid4().hex[:8]}.json"
+    key = f"raw/weather/date={date_str}/{ingestion_id}.json"
 
-    payload = "\n".join(json.dumps(record) for record in records)
+    payload = "\n".join(map(json.dumps, records)).encode("utf-8")
 
     S3_CLIENT.put_object(
         Bucket=DATALAKE_BUCKET,
         Key=key,
-        Body=payload.encode("utf-8"),
+        Body=payload,
         ContentType="application/json"
     )
     logger.info("Wrote %d records to s3://%s/%s", len(records), DATALAKE_BUCKET, key)
@@ -96,28 +121,34 @@ def write_to_s3(records: list[dict], city_name: str, date_str: str):
 def handler(event, context):
     """Lambda entry point."""
     logger.info("Starting batch ingest for %d cities", len(CITIES))
-    date_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    now = datetime.now(timezone.utc)
+    date_str = now.strftime("%Y-%m-%d")
+    ingested_at = now.isoformat()  # shared by every record of this run
     ingestion_id = uuid.uuid4().hex
 
-    total_records = 0
+    all_records = []
     errors = 0
 
-    for city in CITIES:
-        weather_data = fetch_weather(city)
+    # Open-Meteo calls are network-bound — fetch all cities concurrently
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(CITIES)))) as executor:
+        responses = list(executor.map(fetch_weather, CITIES))
+
+    for city, weather_data in zip(CITIES, responses):
         if weather_data is None:
             errors += 1
             continue
 
-        records = transform_response(city, weather_data, ingestion_id)
-        write_to_s3(records, city["name"], date_str)
-        total_records += len(records)
+        all_records.extend(transform_response(city, weather_data, ingestion_id, ingested_at))
+
+    # One PUT per invocation rather than one per city
+    write_to_s3(all_records, date_str, ingestion_id)
 
     summary = {
         "ingestion_id": ingestion_id,
         "date": date_str,
         "cities_processed": len(CITIES) - errors,
         "cities_failed": errors,
-        "total_records": total_records,
+        "total_records": len(all_records),
         "environment": ENVIRONMENT
     }
     logger.info("Batch ingest complete: %s", json.dumps(summary))